@@ -1,446 +1,602 @@
-import logging
-import aiohttp
-import asyncio
-import base64
-import os
-import mimetypes
-import voluptuous as vol
-import homeassistant.helpers.config_validation as cv
-from homeassistant.core import HomeAssistant
-from homeassistant.components.webhook import async_register, async_unregister
-from homeassistant.helpers.discovery import async_load_platform
-
-from .webhook import generate_webhook_id, generate_secret_key, handle_webhook
-
-_LOGGER = logging.getLogger(__name__)
-
-DOMAIN = "voipms_sms"
-DATA_KEY = "voipms_sms_data"
-
-# Define configuration schema
-CONFIG_SCHEMA = vol.Schema({
-    DOMAIN: vol.Schema({
-        vol.Required("account_user"): cv.string,
-        vol.Required("api_password"): cv.string,
-        vol.Required("did"): cv.string,
-    })
-}, extra=vol.ALLOW_EXTRA)
-
-REST_ENDPOINT = "https://voip.ms/api/v1/rest.php"
-
-
-async def get_base64_data(image_path):
-    def encode():
-        mime_type, _ = mimetypes.guess_type(image_path)
-        if not mime_type:
-            mime_type = 'application/octet-stream'
-        with open(image_path, 'rb') as f:
-            encoded = base64.b64encode(f.read()).decode()
-        return f"data:{mime_type};base64,{encoded}"
-    return await asyncio.to_thread(encode)
-
-
-async def _setup_voipms_sms(hass: HomeAssistant, user: str, password: str, did: str, config: dict = None, entry=None):
-    """Shared setup logic for both YAML and config entry setups."""
-    if not user or not password or not did:
-        _LOGGER.error("Missing required configuration fields: user=%s, password=%s, did=%s", 
-                     bool(user), bool(password), bool(did))
-        return False
-
-    # Initialize data storage
-    hass.data.setdefault(DATA_KEY, {
-        "webhooks": {},
-        "secret_keys": {},
-        "entries": {},
-        "yaml_config": None,
-    })
-    hass.data.setdefault("voipms_sms_sensors", {})
-    
-    # Store YAML config data if provided (for backward compatibility)
-    if config:
-        hass.data[DATA_KEY]["yaml_config"] = {
-            "account_user": user,
-            "api_password": password,
-            "did": did,
-        }
-
-    # Generate or retrieve secret key for this DID
-    # Store in config entry options for persistence across restarts
-    secret_key = None
-    
-    # Try to get from config entry options first (for persistence)
-    if entry:
-        secret_key = entry.options.get("webhook_secret_key")
-        if secret_key:
-            _LOGGER.debug("voipms_sms: Retrieved persistent secret key for DID %s", did)
-    else:
-        # For YAML config, try to find matching entry
-        entries = hass.config_entries.async_entries(DOMAIN)
-        for config_entry in entries:
-            if config_entry.data.get("did") == did:
-                secret_key = config_entry.options.get("webhook_secret_key")
-                entry = config_entry
-                break
-    
-    # If not found, generate new one
-    if not secret_key:
-        secret_key = generate_secret_key()
-        _LOGGER.info("voipms_sms: Generated new secret key for DID %s (will persist across restarts)", did)
-        
-        # Save to config entry options for persistence
-        if entry:
-            options = dict(entry.options)
-            options["webhook_secret_key"] = secret_key
-            hass.config_entries.async_update_entry(entry, options=options)
-            _LOGGER.debug("voipms_sms: Saved secret key to config entry options for DID %s", did)
-    
-    # Store in memory for this session
-    hass.data[DATA_KEY]["secret_keys"][did] = secret_key
-    
-    webhook_id = generate_webhook_id(did, secret_key)
-    
-    # Store webhook info
-    hass.data[DATA_KEY]["webhooks"][did] = webhook_id
-    
-    # Register webhook
-    async_register(
-        hass,
-        DOMAIN,
-        f"VoIP.ms SMS Webhook for {did}",
-        webhook_id,
-        lambda hass, wid, req: handle_webhook(hass, wid, req),
-    )
-    
-    _LOGGER.info(
-        "voipms_sms: Registered webhook for %s with ID: %s",
-        did,
-        webhook_id
-    )
-
-    # Check if sensor already exists for this DID to avoid duplicates
-    sensors = hass.data.get("voipms_sms_sensors", {})
-    if did not in sensors:
-        # Load sensor platform for this DID
-        discovery_info = {"phone_number": did, "webhook_id": webhook_id}
-        hass.async_create_task(
-            async_load_platform(
-                hass,
-                "sensor",
-                DOMAIN,
-                discovery_info,
-                config or {},
-            )
-        )
-    else:
-        _LOGGER.debug("voipms_sms: Sensor already exists for DID %s, skipping creation", did)
-
-    return True
-
-
-async def async_setup_entry(hass: HomeAssistant, entry):
-    """Set up VoIP.ms SMS from a config entry."""
-    # Store entry data
-    hass.data.setdefault(DATA_KEY, {
-        "webhooks": {},
-        "secret_keys": {},
-        "entries": {},
-    })
-    
-    # Extract configuration from entry
-    user = entry.data.get("account_user")
-    password = entry.data.get("api_password")
-    did = entry.data.get("did")
-    
-    if not user or not password or not did:
-        _LOGGER.error("Config entry missing required fields: account_user=%s, api_password=%s, did=%s",
-                     bool(user), bool(password), bool(did))
-        return False
-    
-    # Store entry data
-    hass.data[DATA_KEY]["entries"][entry.entry_id] = entry.data
-    
-    # Set up this entry using shared setup logic (pass entry for persistent secret key)
-    result = await _setup_voipms_sms(hass, user, password, did, entry=entry)
-    
-    # Register services only once (on first entry)
-    if len(hass.data[DATA_KEY]["entries"]) == 1:
-        _register_services(hass)
-    
-    return result
-
-
-def _validate_phone_number(phone: str) -> bool:
-    """Validate phone number format."""
-    if not phone:
-        return False
-    # Remove common formatting characters
-    cleaned = phone.replace("+", "").replace("-", "").replace(" ", "").replace("(", "").replace(")", "")
-    # Should be numeric and at least 10 digits
-    return cleaned.isdigit() and len(cleaned) >= 10
-
-
-async def send_sms(hass, user, password, sender_did, call):
-    """Send SMS using VoIP.ms API."""
-    recipient = call.data.get("recipient")
-    message = call.data.get("message")
-
-    if not recipient or not message:
-        _LOGGER.error("Recipient or message missing.")
-        return
-    
-    # Validate phone number
-    if not _validate_phone_number(recipient):
-        _LOGGER.error("Invalid recipient phone number format")
-        return
-
-    params = {
-        "api_username": user,
-        "api_password": password,
-        "did": sender_did,
-        "dst": recipient,
-        "method": "sendSMS",
-        "message": message,
-    }
-
-    async with aiohttp.ClientSession() as session:
-        async with session.get(REST_ENDPOINT, params=params) as response:
-            result = await response.text()
-            if response.status == 200:
-                _LOGGER.info("voipms_sms: SMS sent successfully")
-            else:
-                # Don't log full response as it may contain sensitive data
-                _LOGGER.error("voipms_sms: Failed to send SMS. Status: %s", response.status)
-
-
-def _validate_image_path(image_path: str) -> bool:
-    """Validate image path to prevent path traversal attacks."""
-    if not image_path:
-        return False
-    
-    # Require absolute paths for security
-    if not os.path.isabs(image_path):
-        return False
-    
-    # Normalize the path to prevent directory traversal
-    normalized = os.path.normpath(image_path)
-    absolute_normalized = os.path.abspath(normalized)
-    
-    # Ensure normalization didn't introduce path traversal
-    if normalized != absolute_normalized or ".." in normalized:
-        return False
-    
-    # Additional check: ensure path doesn't contain dangerous patterns
-    dangerous_patterns = ["../", "..\\", "~", "/etc/", "/root/", "C:\\Windows\\"]
-    normalized_lower = normalized.lower()
-    for pattern in dangerous_patterns:
-        if pattern.lower() in normalized_lower:
-            return False
-    
-    return True
-
-
-async def send_mms(hass, user, password, sender_did, call):
-    """Send MMS using VoIP.ms API."""
-    recipient = call.data.get("recipient")
-    message = call.data.get("message")
-    image_path = call.data.get("image_path")
-
-    if not recipient or not message or not image_path:
-        _LOGGER.error("voipms_sms: Required parameter missing (Recipient or message or image path)")
-        return
-
-    # Validate image path for security
-    if not _validate_image_path(image_path):
-        _LOGGER.error("voipms_sms: Invalid image path - path traversal detected or path not absolute")
-        return
-
-    if not os.path.exists(image_path):
-        _LOGGER.error("voipms_sms: Image file not found")
-        return
-
-    media_data = await get_base64_data(image_path)
-
-    form_data = {
-        'api_username': str(user), 
-        'api_password': str(password),
-        'did': str(sender_did),
-        'dst': str(recipient),
-        'message': str(message),
-        'method': str('sendMMS'),
-        'media1': str(media_data)
-    }
-
-    async with aiohttp.ClientSession() as session:
-        with aiohttp.MultipartWriter("form-data") as mp:
-            for key, value in form_data.items():
-                part = mp.append(value)
-                part.set_content_disposition('form-data', name=key)
-
-        async with session.post(REST_ENDPOINT, data=mp) as response:
-            response_text = await response.text()
-            if response.status == 200:
-                _LOGGER.info("voipms_sms: MMS sent successfully")
-            else:
-                # Don't log full response as it may contain sensitive data
-                _LOGGER.error("voipms_sms: Failed to send MMS. Status: %s", response.status)
-
-
-async def async_setup(hass: HomeAssistant, config: dict):
-    """Set up the VoIP.ms SMS integration from YAML config."""
-    # Only proceed if YAML config is present (not called from config entry)
-    if DOMAIN not in config:
-        return True  # Config entry setup will handle it
-    
-    conf = config.get(DOMAIN, {})
-    user = conf.get("account_user")
-    password = conf.get("api_password")
-    did = conf.get("did")
-
-    if not user or not password or not did:
-        _LOGGER.error("Missing required configuration fields.")
-        return False
-
-    # Use shared setup logic (for YAML, no entry available)
-    result = await _setup_voipms_sms(hass, user, password, did, config=config)
-
-    # Register services (for YAML config or if not already registered)
-    if result and not hass.services.has_service(DOMAIN, "send_sms"):
-        _register_services(hass)
-    
-    return result
-
-
-def _get_config_data(hass: HomeAssistant):
-    """Get configuration data from either config entries or YAML."""
-    data_key = hass.data.get(DATA_KEY, {})
-    
-    # Try config entries first
-    entries = data_key.get("entries", {})
-    if entries:
-        return next(iter(entries.values()))
-    
-    # Fall back to YAML config
-    yaml_config = data_key.get("yaml_config")
-    if yaml_config:
-        return yaml_config
-    
-    return None
-
-
-def _register_services(hass: HomeAssistant):
-    """Register domain-level services that work with config entries or YAML config."""
-    async def handle_send_sms(call):
-        """Handle send_sms service call."""
-        config_data = _get_config_data(hass)
-        if not config_data:
-            _LOGGER.error("voipms_sms: No configuration found. Please set up the integration.")
-            return
-        
-        user = config_data.get("account_user")
-        password = config_data.get("api_password")
-        did = config_data.get("did")
-        
-        await send_sms(hass, user, password, did, call)
-
-    async def handle_send_mms(call):
-        """Handle send_mms service call."""
-        config_data = _get_config_data(hass)
-        if not config_data:
-            _LOGGER.error("voipms_sms: No configuration found. Please set up the integration.")
-            return
-        
-        user = config_data.get("account_user")
-        password = config_data.get("api_password")
-        did = config_data.get("did")
-        
-        # Validate recipient phone number
-        recipient = call.data.get("recipient")
-        if recipient and not _validate_phone_number(recipient):
-            _LOGGER.error("Invalid recipient phone number format")
-            return
-        
-        await send_mms(hass, user, password, did, call)
-
-    async def handle_get_webhook_url(call):
-        """Service to get webhook URL for the configured DID - displays in GUI notification."""
-        from homeassistant.components import persistent_notification
-        
-        config_data = _get_config_data(hass)
-        if not config_data:
-            _LOGGER.error("voipms_sms: No configuration found. Please set up the integration.")
-            persistent_notification.async_create(
-                hass,
-                "No configuration found. Please set up the integration.",
-                title="VoIP.ms SMS",
-                notification_id="voipms_sms_error"
-            )
-            return
-        
-        did = config_data.get("did")
-        
-        webhook_id = hass.data.get(DATA_KEY, {}).get("webhooks", {}).get(did)
-        
-        if not webhook_id:
-            _LOGGER.error("voipms_sms: No webhook found for DID: %s", did)
-            persistent_notification.async_create(
-                hass,
-                f"No webhook found for DID: {did}",
-                title="VoIP.ms SMS",
-                notification_id="voipms_sms_error"
-            )
-            return
-        
-        # Get the actual Home Assistant URL
-        base_url = None
-        if hass.config.external_url:
-            base_url = str(hass.config.external_url).rstrip('/')
-            _LOGGER.debug("voipms_sms: Using external_url: %s", base_url)
-        elif hass.config.internal_url:
-            base_url = str(hass.config.internal_url).rstrip('/')
-            _LOGGER.debug("voipms_sms: Using internal_url: %s", base_url)
-        else:
-            # Fallback: try to construct from known config
-            _LOGGER.warning("voipms_sms: No external or internal URL configured in Home Assistant. Please set external_url or internal_url in configuration.yaml")
-            # Try to get from the request if available, or use a placeholder
-            base_url = "http://your-ha-instance:8123"
-        
-        webhook_url = f"{base_url}/api/webhook/{webhook_id}"
-        _LOGGER.debug("voipms_sms: Generated webhook URL: %s", webhook_url)
-        
-        # Show persistent notification with webhook URL
-        persistent_notification.async_create(
-            hass,
-            f"**Webhook URL for DID {did}:**\n\n`{webhook_url}`\n\nCopy this URL and configure it in your VoIP.ms portal under SMS settings.",
-            title="VoIP.ms SMS - Webhook URL",
-            notification_id="voipms_sms_webhook_url"
-        )
-        _LOGGER.info("voipms_sms: Webhook URL displayed in notification for %s", did)
-
-    hass.services.async_register(DOMAIN, "send_sms", handle_send_sms)
-    hass.services.async_register(DOMAIN, "send_mms", handle_send_mms)
-    hass.services.async_register(DOMAIN, "get_webhook_url", handle_get_webhook_url)
-
-    _LOGGER.info("voipms_sms: VoIP.ms SMS/MMS services registered successfully.")
-
-
-async def async_unload_entry(hass: HomeAssistant, entry):
-    """Unload VoIP.ms SMS config entry."""
-    # Remove entry data
-    if DATA_KEY in hass.data and "entries" in hass.data[DATA_KEY]:
-        hass.data[DATA_KEY]["entries"].pop(entry.entry_id, None)
-    
-    # Unregister webhook for this entry's DID
-    did = entry.data.get("did")
-    if did and DATA_KEY in hass.data:
-        webhook_id = hass.data[DATA_KEY].get("webhooks", {}).pop(did, None)
-        if webhook_id:
-            try:
-                async_unregister(hass, webhook_id)
-                _LOGGER.info("voipms_sms: Unregistered webhook for %s", did)
-            except Exception as e:
-                _LOGGER.warning("voipms_sms: Failed to unregister webhook: %s", e)
-        
-        # Clean up secret key
-        hass.data[DATA_KEY].get("secret_keys", {}).pop(did, None)
-    
-    return True
+import asyncio
+import functools
+import logging
+import aiofiles
+import aiohttp
+import binascii
+import os
+import re
+import mimetypes
+import voluptuous as vol
+import homeassistant.helpers.config_validation as cv
+from homeassistant.const import EVENT_CORE_CONFIG_UPDATE
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.components.webhook import async_register, async_unregister
+from homeassistant.helpers.discovery import async_load_platform
+
+from .webhook import generate_webhook_id, generate_secret_key, handle_webhook
+
+_LOGGER = logging.getLogger(__name__)
+
+DOMAIN = "voipms_sms"
+DATA_KEY = "voipms_sms_data"
+
+# Define configuration schema
+CONFIG_SCHEMA = vol.Schema({
+    DOMAIN: vol.Schema({
+        vol.Required("account_user"): cv.string,
+        vol.Required("api_password"): cv.string,
+        vol.Required("did"): cv.string,
+    })
+}, extra=vol.ALLOW_EXTRA)
+
+REST_ENDPOINT = "https://voip.ms/api/v1/rest.php"
+
+
+def _init_data(hass: HomeAssistant) -> dict:
+    """Initialize the integration's hass.data bucket exactly once.
+
+    A guarded assignment instead of setdefault: the dict literal is only
+    constructed when actually needed, and every setup path shares the same
+    schema instead of the previously divergent initial dicts.
+    """
+    if DATA_KEY not in hass.data:
+        hass.data[DATA_KEY] = {
+            "webhooks": {},
+            "secret_keys": {},
+            "entries": {},
+            "yaml_config": None,
+        }
+        # Sensor lookup dicts are created here exactly once; the sensor
+        # platform and webhook handler use plain dict access afterwards
+        hass.data["voipms_sms_sensors"] = {}
+        hass.data["voipms_sms_sensors_by_e164"] = {}
+    return hass.data[DATA_KEY]
+
+
+async def _get_session(hass: HomeAssistant) -> aiohttp.ClientSession:
+    """Return the shared HTTP session, creating it lazily on first use.
+
+    Reusing one session keeps the connection pool (and TLS session) to
+    voip.ms alive across service calls instead of paying a fresh
+    TCP + TLS handshake per SMS/MMS.
+    """
+    data = _init_data(hass)
+    session = data.get("session")
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=20, ttl_dns_cache=300)
+        )
+        data["session"] = session
+    return session
+
+
+# Read size for streaming base64 encoding. Must be a multiple of 3 so each
+# chunk encodes without intermediate padding; 18KB in + ~24KB out also fits
+# in a typical 32KB L1 cache, keeping the C-level encode loop L1-resident.
+_B64_CHUNK = 18 * 1024
+
+
+@functools.lru_cache(maxsize=128)
+def _guess_mime(image_path: str) -> str:
+    """Guess the MIME type for a path, cached for repeated sends."""
+    mime_type, _ = mimetypes.guess_type(image_path)
+    return mime_type or 'application/octet-stream'
+
+
+async def _b64_stream(image_path, mime_type):
+    """Yield a base64 data URI chunk by chunk for streaming multipart upload.
+
+    Nothing is accumulated: aiohttp writes each chunk to the socket as it
+    is produced, so peak memory stays O(chunk) instead of O(file). Async
+    reads via aiofiles interleave with other coroutines, and encoding a
+    chunk is a microsecond-scale C call that can run inline on the loop.
+    """
+    yield f"data:{mime_type};base64,".encode('ascii')
+    async with aiofiles.open(image_path, 'rb') as f:
+        while chunk := await f.read(_B64_CHUNK):
+            yield binascii.b2a_base64(chunk, newline=False)
+
+
+@callback
+def _refresh_base_url(hass: HomeAssistant, event=None) -> None:
+    """Cache the instance base URL; it only changes on core config updates."""
+    if hass.config.external_url:
+        base_url = str(hass.config.external_url).rstrip('/')
+    elif hass.config.internal_url:
+        base_url = str(hass.config.internal_url).rstrip('/')
+    else:
+        base_url = None
+    hass.data[DATA_KEY]["base_url"] = base_url
+
+
+async def _setup_voipms_sms(hass: HomeAssistant, user: str, password: str, did: str, config: dict = None, entry=None):
+    """Shared setup logic for both YAML and config entry setups."""
+    if not user or not password or not did:
+        _LOGGER.error("Missing required configuration fields: user=%s, password=%s, did=%s", 
+                     bool(user), bool(password), bool(did))
+        return False
+
+    # Initialize data storage
+    data = _init_data(hass)
+
+    # Cache the base URL once and keep it fresh on core config updates
+    # instead of recomputing it in the options flow / webhook URL service
+    if "base_url" not in data:
+        _refresh_base_url(hass)
+        hass.bus.async_listen(
+            EVENT_CORE_CONFIG_UPDATE, functools.partial(_refresh_base_url, hass)
+        )
+    
+    # Store YAML config data if provided (for backward compatibility)
+    if config:
+        hass.data[DATA_KEY]["yaml_config"] = {
+            "account_user": user,
+            "api_password": password,
+            "did": did,
+        }
+        hass.data[DATA_KEY].pop("_resolved", None)
+
+    # Short-circuit if this DID is already fully set up (e.g. YAML + config
+    # entry both triggering setup, or a reload): the webhook is registered
+    # and the sensor exists, so regenerating the webhook ID and re-calling
+    # async_register would be redundant work.
+    existing_webhook = hass.data[DATA_KEY]["webhooks"].get(did)
+    if existing_webhook:
+        _LOGGER.debug(
+            "voipms_sms: Webhook already registered for DID %s (%s), skipping setup",
+            did,
+            existing_webhook,
+        )
+        return True
+
+    # Generate or retrieve secret key for this DID
+    # Store in config entry options for persistence across restarts
+    secret_key = None
+    
+    # Try to get from config entry options first (for persistence)
+    if entry:
+        secret_key = entry.options.get("webhook_secret_key")
+        if secret_key:
+            _LOGGER.debug("voipms_sms: Retrieved persistent secret key for DID %s", did)
+    else:
+        # For YAML config, try to find matching entry
+        entries = hass.config_entries.async_entries(DOMAIN)
+        for config_entry in entries:
+            if config_entry.data.get("did") == did:
+                secret_key = config_entry.options.get("webhook_secret_key")
+                entry = config_entry
+                break
+    
+    # If not found, generate new one
+    if not secret_key:
+        secret_key = generate_secret_key()
+        _LOGGER.info("voipms_sms: Generated new secret key for DID %s (will persist across restarts)", did)
+        
+        # Save to config entry options for persistence
+        if entry:
+            options = dict(entry.options)
+            options["webhook_secret_key"] = secret_key
+            hass.config_entries.async_update_entry(entry, options=options)
+            _LOGGER.debug("voipms_sms: Saved secret key to config entry options for DID %s", did)
+    
+    # Store in memory for this session
+    hass.data[DATA_KEY]["secret_keys"][did] = secret_key
+    
+    webhook_id = generate_webhook_id(did, secret_key)
+    
+    # Store webhook info
+    hass.data[DATA_KEY]["webhooks"][did] = webhook_id
+    
+    # Register webhook
+    async_register(
+        hass,
+        DOMAIN,
+        f"VoIP.ms SMS Webhook for {did}",
+        webhook_id,
+        handle_webhook,
+    )
+    
+    _LOGGER.info(
+        "voipms_sms: Registered webhook for %s with ID: %s",
+        did,
+        webhook_id
+    )
+
+    # Check if sensor already exists for this DID to avoid duplicates
+    sensors = hass.data.get("voipms_sms_sensors", {})
+    if did not in sensors:
+        # Load sensor platform for this DID
+        discovery_info = {"phone_number": did, "webhook_id": webhook_id}
+        hass.async_create_task(
+            async_load_platform(
+                hass,
+                "sensor",
+                DOMAIN,
+                discovery_info,
+                config or {},
+            )
+        )
+    else:
+        _LOGGER.debug("voipms_sms: Sensor already exists for DID %s, skipping creation", did)
+
+    return True
+
+
+async def async_setup_entry(hass: HomeAssistant, entry):
+    """Set up VoIP.ms SMS from a config entry."""
+    _init_data(hass)
+
+    # Extract configuration from entry
+    user = entry.data.get("account_user")
+    password = entry.data.get("api_password")
+    did = entry.data.get("did")
+    
+    if not user or not password or not did:
+        _LOGGER.error("Config entry missing required fields: account_user=%s, api_password=%s, did=%s",
+                     bool(user), bool(password), bool(did))
+        return False
+    
+    # Store entry data and invalidate the cached resolved config
+    hass.data[DATA_KEY]["entries"][entry.entry_id] = entry.data
+    hass.data[DATA_KEY].pop("_resolved", None)
+
+    # Set up this entry using shared setup logic (pass entry for persistent secret key)
+    result = await _setup_voipms_sms(hass, user, password, did, entry=entry)
+    
+    # Register services only once (on first entry)
+    if len(hass.data[DATA_KEY]["entries"]) == 1:
+        _register_services(hass)
+    
+    return result
+
+
+# Translation table stripping common phone formatting characters in one pass
+_PHONE_STRIP = str.maketrans('', '', '+-() ')
+
+# A bare DID/phone number: 10-15 digits per E.164. Compiled once at import;
+# also used by the config flow for DID validation.
+_DID_RE = re.compile(r'^\d{10,15}$')
+
+
+def _validate_phone_number(phone: str) -> bool:
+    """Validate phone number format."""
+    if not phone:
+        return False
+    # Remove common formatting characters, then match digits-only in one pass
+    return _DID_RE.match(phone.translate(_PHONE_STRIP)) is not None
+
+
+async def send_sms(hass, user, password, sender_did, call):
+    """Send SMS using VoIP.ms API."""
+    recipient = call.data.get("recipient")
+    message = call.data.get("message")
+
+    if not recipient or not message:
+        _LOGGER.error("Recipient or message missing.")
+        return
+    
+    # Validate phone number
+    if not _validate_phone_number(recipient):
+        _LOGGER.error("Invalid recipient phone number format")
+        return
+
+    params = {
+        "api_username": user,
+        "api_password": password,
+        "did": sender_did,
+        "dst": recipient,
+        "method": "sendSMS",
+        "message": message,
+    }
+
+    session = await _get_session(hass)
+    async with session.get(REST_ENDPOINT, params=params) as response:
+        if response.status == 200:
+            # Drain without decoding so the connection goes back to the pool
+            await response.read()
+            _LOGGER.info("voipms_sms: SMS sent successfully")
+        else:
+            # Don't log full response as it may contain sensitive data
+            _LOGGER.error("voipms_sms: Failed to send SMS. Status: %s", response.status)
+
+
+def _validate_image_path(hass: HomeAssistant, image_path: str) -> bool:
+    """Validate that an image path resolves inside an allowed directory.
+
+    Resolving the path with realpath and prefix-checking it against the
+    www and media directories replaces the old substring blacklist: one
+    syscall and a prefix compare instead of repeated lowercased scans, and
+    it closes the ".." bypass instead of rejecting any path containing "~".
+    """
+    if not image_path or not os.path.isabs(image_path):
+        return False
+    real = os.path.realpath(image_path)
+    allowed_dirs = [hass.config.path("www"), *hass.config.media_dirs.values()]
+    return any(real.startswith(os.path.realpath(d) + os.sep) for d in allowed_dirs)
+
+
+async def send_mms(hass, user, password, sender_did, call):
+    """Send MMS using VoIP.ms API."""
+    recipient = call.data.get("recipient")
+    message = call.data.get("message")
+    image_path = call.data.get("image_path")
+
+    if not recipient or not message or not image_path:
+        _LOGGER.error("voipms_sms: Required parameter missing (Recipient or message or image path)")
+        return
+
+    # Validate image path for security
+    if not _validate_image_path(hass, image_path):
+        _LOGGER.error("voipms_sms: Invalid image path - must be an absolute path inside the www or media directories")
+        return
+
+    if not os.path.exists(image_path):
+        _LOGGER.error("voipms_sms: Image file not found")
+        return
+
+    mime_type = _guess_mime(image_path)
+
+    form_data = {
+        'api_username': user,
+        'api_password': password,
+        'did': sender_did,
+        'dst': recipient,
+        'message': message,
+        'method': 'sendMMS',
+    }
+
+    session = await _get_session(hass)
+    # FormData streams each part to the socket and negotiates headers
+    # itself; the old MultipartWriter block also exited its `with` before
+    # the POST ran, using the writer after close.
+    data = aiohttp.FormData()
+    for key, value in form_data.items():
+        data.add_field(key, value)
+    # Stream the media part: base64 chunks are encoded on the fly and
+    # written straight to the socket instead of being materialized. The
+    # explicit content type forces multipart encoding for the request.
+    data.add_field('media1', _b64_stream(image_path, mime_type), content_type='text/plain')
+
+    async with session.post(REST_ENDPOINT, data=data) as response:
+        if response.status == 200:
+            # Drain without decoding so the connection goes back to the pool
+            await response.read()
+            _LOGGER.info("voipms_sms: MMS sent successfully")
+        else:
+            # Don't log full response as it may contain sensitive data
+            _LOGGER.error("voipms_sms: Failed to send MMS. Status: %s", response.status)
+
+
+async def async_setup(hass: HomeAssistant, config: dict):
+    """Set up the VoIP.ms SMS integration from YAML config."""
+    # Only proceed if YAML config is present (not called from config entry)
+    if DOMAIN not in config:
+        return True  # Config entry setup will handle it
+    
+    conf = config.get(DOMAIN, {})
+    user = conf.get("account_user")
+    password = conf.get("api_password")
+    did = conf.get("did")
+
+    if not user or not password or not did:
+        _LOGGER.error("Missing required configuration fields.")
+        return False
+
+    # Use shared setup logic (for YAML, no entry available)
+    result = await _setup_voipms_sms(hass, user, password, did, config=config)
+
+    # Register services (for YAML config or if not already registered)
+    if result and not hass.services.has_service(DOMAIN, "send_sms"):
+        _register_services(hass)
+    
+    return result
+
+
+# Maximum number of queued sends drained per batch by the tx worker
+_TX_BATCH = 10
+
+
+async def _tx_worker(hass: HomeAssistant):
+    """Drain queued SMS/MMS sends in small batches.
+
+    A single consumer pulling from the queue keeps bursts of service calls
+    (e.g. several automations firing at once) on one HTTP pipeline instead
+    of having every call contend for the connector individually.
+    """
+    queue = hass.data[DATA_KEY]["tx_queue"]
+    while True:
+        batch = [await queue.get()]
+        while len(batch) < _TX_BATCH and not queue.empty():
+            batch.append(queue.get_nowait())
+        results = await asyncio.gather(*batch, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                _LOGGER.error("voipms_sms: Error sending message: %s", result)
+
+
+def _ensure_tx_worker(hass: HomeAssistant) -> None:
+    """Create the send queue and its worker if they are not running."""
+    data = hass.data[DATA_KEY]
+    if "tx_queue" not in data:
+        data["tx_queue"] = asyncio.Queue(maxsize=1000)
+        data["tx_task"] = hass.async_create_background_task(_tx_worker(hass), name="voipms_tx")
+
+
+def _enqueue_send(hass: HomeAssistant, coro, name: str):
+    """Queue a send coroutine for the tx worker, logging if the queue is full."""
+    # Unloading the last config entry tears the queue down, but with YAML
+    # config the services stay registered - lazily recreate the queue and
+    # worker like _get_session does for a closed session
+    _ensure_tx_worker(hass)
+    try:
+        hass.data[DATA_KEY]["tx_queue"].put_nowait(coro)
+    except asyncio.QueueFull:
+        coro.close()
+        _LOGGER.error("voipms_sms: Send queue full, dropping %s call", name)
+
+
+def _get_config_data(hass: HomeAssistant):
+    """Get configuration data from either config entries or YAML.
+
+    The resolved config is cached under "_resolved" since it only changes
+    when entries or YAML config are mutated; those paths invalidate it.
+    """
+    data_key = hass.data.get(DATA_KEY, {})
+
+    resolved = data_key.get("_resolved")
+    if resolved is not None:
+        return resolved
+
+    # Try config entries first, falling back to YAML config
+    entries = data_key.get("entries", {})
+    if entries:
+        resolved = next(iter(entries.values()))
+    else:
+        resolved = data_key.get("yaml_config")
+
+    if resolved is not None:
+        data_key["_resolved"] = resolved
+    return resolved
+
+
+async def _svc_send_sms(hass: HomeAssistant, call):
+    """Handle send_sms service call."""
+    config_data = _get_config_data(hass)
+    if not config_data:
+        _LOGGER.error("voipms_sms: No configuration found. Please set up the integration.")
+        return
+
+    user = config_data.get("account_user")
+    password = config_data.get("api_password")
+    did = config_data.get("did")
+
+    # Queue for the tx worker so the service call returns immediately
+    # instead of blocking the calling automation on the HTTP round-trip;
+    # send_sms logs any failure itself.
+    _enqueue_send(hass, send_sms(hass, user, password, did, call), "send_sms")
+
+
+async def _svc_send_mms(hass: HomeAssistant, call):
+    """Handle send_mms service call."""
+    config_data = _get_config_data(hass)
+    if not config_data:
+        _LOGGER.error("voipms_sms: No configuration found. Please set up the integration.")
+        return
+
+    user = config_data.get("account_user")
+    password = config_data.get("api_password")
+    did = config_data.get("did")
+
+    # Validate recipient phone number
+    recipient = call.data.get("recipient")
+    if recipient and not _validate_phone_number(recipient):
+        _LOGGER.error("Invalid recipient phone number format")
+        return
+
+    # Same fire-and-forget dispatch as send_sms
+    _enqueue_send(hass, send_mms(hass, user, password, did, call), "send_mms")
+
+
+async def _svc_get_webhook_url(hass: HomeAssistant, call):
+    """Service to get webhook URL for the configured DID - displays in GUI notification."""
+    from homeassistant.components import persistent_notification
+
+    config_data = _get_config_data(hass)
+    if not config_data:
+        _LOGGER.error("voipms_sms: No configuration found. Please set up the integration.")
+        persistent_notification.async_create(
+            hass,
+            "No configuration found. Please set up the integration.",
+            title="VoIP.ms SMS",
+            notification_id="voipms_sms_error"
+        )
+        return
+    
+    did = config_data.get("did")
+    
+    webhook_id = hass.data.get(DATA_KEY, {}).get("webhooks", {}).get(did)
+    
+    if not webhook_id:
+        _LOGGER.error("voipms_sms: No webhook found for DID: %s", did)
+        persistent_notification.async_create(
+            hass,
+            f"No webhook found for DID: {did}",
+            title="VoIP.ms SMS",
+            notification_id="voipms_sms_error"
+        )
+        return
+    
+    # Use the base URL cached at setup (refreshed on core config updates)
+    base_url = hass.data.get(DATA_KEY, {}).get("base_url")
+    if not base_url:
+        _LOGGER.warning("voipms_sms: No external or internal URL configured in Home Assistant. Please set external_url or internal_url in configuration.yaml")
+        base_url = "http://your-ha-instance:8123"
+    
+    webhook_url = f"{base_url}/api/webhook/{webhook_id}"
+    _LOGGER.debug("voipms_sms: Generated webhook URL: %s", webhook_url)
+    
+    # Show persistent notification with webhook URL
+    persistent_notification.async_create(
+        hass,
+        f"**Webhook URL for DID {did}:**\n\n`{webhook_url}`\n\nCopy this URL and configure it in your VoIP.ms portal under SMS settings.",
+        title="VoIP.ms SMS - Webhook URL",
+        notification_id="voipms_sms_webhook_url"
+    )
+    _LOGGER.info("voipms_sms: Webhook URL displayed in notification for %s", did)
+
+
+def _register_services(hass: HomeAssistant):
+    """Register domain-level services that work with config entries or YAML config."""
+    # Outgoing sends are funneled through a bounded queue drained by a
+    # single background worker (see _tx_worker). The guard in
+    # _ensure_tx_worker keeps re-registration (YAML + first entry, or an
+    # entry reload) from orphaning a live queue or duplicating the worker.
+    _ensure_tx_worker(hass)
+
+    # Module-level handlers bound with partial instead of per-setup
+    # closures: nothing to re-allocate on reload, and HA traces show the
+    # real qualnames.
+    hass.services.async_register(DOMAIN, "send_sms", functools.partial(_svc_send_sms, hass))
+    hass.services.async_register(DOMAIN, "send_mms", functools.partial(_svc_send_mms, hass))
+    hass.services.async_register(DOMAIN, "get_webhook_url", functools.partial(_svc_get_webhook_url, hass))
+
+    _LOGGER.info("voipms_sms: VoIP.ms SMS/MMS services registered successfully.")
+
+
+async def async_unload_entry(hass: HomeAssistant, entry):
+    """Unload VoIP.ms SMS config entry."""
+    # Remove entry data and invalidate the cached resolved config
+    if DATA_KEY in hass.data and "entries" in hass.data[DATA_KEY]:
+        hass.data[DATA_KEY]["entries"].pop(entry.entry_id, None)
+        hass.data[DATA_KEY].pop("_resolved", None)
+    
+    # Unregister webhook for this entry's DID
+    did = entry.data.get("did")
+    if did and DATA_KEY in hass.data:
+        webhook_id = hass.data[DATA_KEY].get("webhooks", {}).pop(did, None)
+        if webhook_id:
+            try:
+                async_unregister(hass, webhook_id)
+                _LOGGER.info("voipms_sms: Unregistered webhook for %s", did)
+            except Exception as e:
+                _LOGGER.warning("voipms_sms: Failed to unregister webhook: %s", e)
+        
+        # Clean up secret key
+        hass.data[DATA_KEY].get("secret_keys", {}).pop(did, None)
+
+    # Tear down the tx worker and the shared HTTP session once the last
+    # entry is gone
+    if DATA_KEY in hass.data and not hass.data[DATA_KEY].get("entries"):
+        tx_task = hass.data[DATA_KEY].pop("tx_task", None)
+        if tx_task:
+            tx_task.cancel()
+        queue = hass.data[DATA_KEY].pop("tx_queue", None)
+        if queue:
+            while not queue.empty():
+                queue.get_nowait().close()
+        session = hass.data[DATA_KEY].pop("session", None)
+        if session and not session.closed:
+            await session.close()
+
+    return True
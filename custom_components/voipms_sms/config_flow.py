@@ -10,7 +10,7 @@ from homeassistant.data_entry_flow import FlowResult
 from homeassistant.exceptions import HomeAssistantError
 import homeassistant.helpers.config_validation as cv
 
-from . import DOMAIN
+from . import DATA_KEY, DOMAIN, _DID_RE
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -34,7 +34,7 @@ async def validate_input(hass: HomeAssistant, data: dict[str, Any]) -> dict[str,
     
     # Validate DID is numeric and reasonable length (10 digits typically)
     did = data["did"].strip()
-    if not did.isdigit() or len(did) < 10:
+    if not _DID_RE.match(did):
         raise InvalidAuth("DID must be a numeric phone number (at least 10 digits)")
     
     return {"title": f"VoIP.ms SMS ({did})"}
@@ -94,7 +94,6 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
                 return self.async_abort(reason="no_did")
             
             # Get webhook ID from hass.data
-            from . import DATA_KEY
             data_key = self.hass.data.get(DATA_KEY, {})
             if not data_key:
                 _LOGGER.warning("No data key found in hass.data")
@@ -112,15 +111,10 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
                     description=f"**Webhook URL for DID {did}:**\n\nWebhook not yet initialized. Please restart Home Assistant.",
                 )
             
-            # Build webhook URL - get the actual Home Assistant URL
-            base_url = None
-            if self.hass.config.external_url:
-                base_url = str(self.hass.config.external_url).rstrip('/')
-                _LOGGER.debug("voipms_sms: Using external_url in options flow: %s", base_url)
-            elif self.hass.config.internal_url:
-                base_url = str(self.hass.config.internal_url).rstrip('/')
-                _LOGGER.debug("voipms_sms: Using internal_url in options flow: %s", base_url)
-            else:
+            # Use the base URL cached at integration setup (kept fresh on
+            # core config updates) instead of recomputing it per render
+            base_url = data_key.get("base_url")
+            if not base_url:
                 _LOGGER.warning("voipms_sms: No external or internal URL configured in Home Assistant. Please set external_url or internal_url in configuration.yaml")
                 base_url = "http://your-ha-instance:8123"
             
@@ -1,12 +1,11 @@
 """Sensor platform for VoIP.ms SMS incoming messages."""
 import logging
-from datetime import datetime
-from typing import Any
 
 from homeassistant.components.sensor import SensorEntity
 from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
+import homeassistant.util.dt as dt_util
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -28,17 +27,21 @@ async def async_setup_platform(
         _LOGGER.error("Missing phone_number or webhook_id in discovery_info")
         return
 
-    # Check if sensor already exists for this phone number
-    sensors = hass.data.setdefault("voipms_sms_sensors", {})
+    # Check if sensor already exists for this phone number; the lookup
+    # dicts were initialized by the integration before the platform loads
+    sensors = hass.data["voipms_sms_sensors"]
     if phone_number in sensors:
         _LOGGER.debug("voipms_sms: Sensor already exists for %s, skipping duplicate creation", phone_number)
         return
 
     sensor = VoIPMSIncomingSMSSensor(hass, phone_number, webhook_id)
     async_add_entities([sensor], True)
-    
-    # Store sensor reference in hass.data for webhook updates
+
+    # Store sensor reference in hass.data for webhook updates; the second
+    # dict is keyed by the last 10 digits so webhook dispatch can resolve
+    # the sensor with a single lookup instead of scanning every sensor.
     sensors[phone_number] = sensor
+    hass.data["voipms_sms_sensors_by_e164"][phone_number[-10:]] = sensor
 
 
 class VoIPMSIncomingSMSSensor(SensorEntity):
@@ -52,52 +55,50 @@ class VoIPMSIncomingSMSSensor(SensorEntity):
         self._attr_name = f"VoIP.ms SMS {phone_number}"
         self._attr_unique_id = f"voipms_sms_incoming_{phone_number}"
         self._state = "No messages"
-        self._from = None
-        self._message = None
-        self._last_updated = None
-        self._message_id = None
+        # Attributes are cached in one dict mutated on webhook updates
+        # rather than rebuilt on every attribute read (HA polls attributes
+        # frequently). webhook_url is deliberately not exposed here for
+        # security/privacy - users can get it via the service call.
+        self._attr_extra_state_attributes = {
+            "from": None,
+            "message": None,
+            "last_updated": None,
+            "message_id": None,
+            "phone_number": phone_number,
+        }
 
     @property
     def state(self) -> str:
         """Return the state of the sensor."""
         return self._state
 
-    @property
-    def extra_state_attributes(self) -> dict[str, Any]:
-        """Return sensor attributes."""
-        # Don't expose webhook_url in attributes for security/privacy
-        # Users can get it via the service call if needed
-        return {
-            "from": self._from,
-            "message": self._message,
-            "last_updated": self._last_updated,
-            "message_id": self._message_id,
-            "phone_number": self._phone_number,
-        }
-
     @property
     def icon(self) -> str:
         """Return the icon."""
         return "mdi:message-text-outline"
 
     @callback
-    def update_from_webhook(self, data: dict) -> None:
-        """Update sensor from incoming webhook data."""
+    def update_from_webhook(self, payload: dict) -> None:
+        """Update sensor from an already-parsed webhook message payload.
+
+        The webhook handler has already unwrapped data["data"]["payload"],
+        so there is no need to re-walk the envelope here.
+        """
         try:
-            payload = data.get("data", {}).get("payload", {})
-            
-            self._from = payload.get("from", {}).get("phone_number")
-            self._message = payload.get("text")
-            self._message_id = payload.get("id")
-            self._last_updated = datetime.now().isoformat()
-            self._state = f"Message from {self._from}" if self._from else "New message"
-            
+            sender = payload.get("from", {}).get("phone_number")
+            attrs = self._attr_extra_state_attributes
+            attrs["from"] = sender
+            attrs["message"] = payload.get("text")
+            attrs["message_id"] = payload.get("id")
+            attrs["last_updated"] = dt_util.utcnow().isoformat()
+            self._state = f"Message from {sender}" if sender else "New message"
+
             self.async_write_ha_state()
             # Log receipt but don't log full message content for privacy
             _LOGGER.info(
                 "voipms_sms: Received SMS on %s from %s",
                 self._phone_number,
-                self._from
+                sender
             )
         except Exception as e:
             _LOGGER.error("voipms_sms: Error updating sensor from webhook: %s", e)
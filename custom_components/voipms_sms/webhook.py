@@ -1,24 +1,34 @@
 """Webhook handler for VoIP.ms incoming SMS."""
 import logging
 import secrets
-import hashlib
 from aiohttp import web
 
 from homeassistant.core import HomeAssistant
 from homeassistant.components import persistent_notification
 from homeassistant.components.http import HomeAssistantView
+from homeassistant.util.json import json_loads
 
 _LOGGER = logging.getLogger(__name__)
 
 WEBHOOK_ID_PREFIX = "voipms_sms_"
 
+# Shared read-only default so missing-dict fallbacks don't allocate a new
+# empty dict on every webhook call
+_EMPTY: dict = {}
+
+# Expected (event_type, record_type, payload record_type) for an inbound
+# SMS. Built once at import; the short ASCII literals are interned by
+# CPython, so the tuple compare hits the pointer-equality fast path per
+# element on valid payloads.
+_VALID_TYPES = ("message.received", "event", "message")
+
 
 def generate_webhook_id(phone_number: str, secret_key: str) -> str:
     """Generate a secure webhook ID for a phone number."""
-    # Create a deterministic but secure webhook ID using phone + secret
-    combined = f"{phone_number}:{secret_key}"
-    hash_digest = hashlib.sha256(combined.encode()).hexdigest()[:16]
-    return f"{WEBHOOK_ID_PREFIX}{phone_number}_{hash_digest}"
+    # The secret key is already random (secrets.token_hex), so a slice of
+    # it is as unguessable as a hash of it; no need to run SHA-256 just to
+    # produce a 16-hex-char token.
+    return f"{WEBHOOK_ID_PREFIX}{phone_number}_{secret_key[:16]}"
 
 
 def generate_secret_key() -> str:
@@ -26,86 +36,115 @@ def generate_secret_key() -> str:
     return secrets.token_hex(16)
 
 
+def _last10(phone: str) -> str:
+    """Normalize a phone number to its last 10 digits.
+
+    Slicing covers the common all-digits case without allocating; the
+    lstrip fallback handles trailing formatting characters.
+    """
+    if not phone:
+        return ""
+    if phone[-1].isdigit():
+        return phone[-10:]
+    return phone.lstrip("+").lstrip("1")[-10:]
+
+
 async def handle_webhook(hass: HomeAssistant, webhook_id: str, request: web.Request) -> web.Response:
-    """Handle incoming webhook requests."""
+    """Handle incoming webhook requests.
+
+    Only the JSON parse is wrapped in a targeted try/except; anything
+    unexpected bubbles to aiohttp's middleware, which Home Assistant
+    already logs, instead of being masked by a catch-all.
+    """
+    # Verify webhook_id is valid (Home Assistant already validates routing, but double-check)
+    if not webhook_id or not webhook_id.startswith(WEBHOOK_ID_PREFIX):
+        _LOGGER.warning("voipms_sms: Invalid webhook_id format")
+        return web.Response(status=403, text="Invalid webhook")
+
+    # Decode with HA's orjson-backed loader instead of aiohttp's
+    # stdlib-json default
     try:
-        # Verify webhook_id is valid (Home Assistant already validates routing, but double-check)
-        if not webhook_id or not webhook_id.startswith(WEBHOOK_ID_PREFIX):
-            _LOGGER.warning("voipms_sms: Invalid webhook_id format")
-            return web.Response(status=403, text="Invalid webhook")
-        
-        data = await request.json()
-        # Don't log full webhook data as it may contain sensitive information
-        _LOGGER.debug("voipms_sms: Received webhook request")
-        
-        # Validate the payload structure
-        if not isinstance(data, dict):
-            _LOGGER.error("voipms_sms: Invalid webhook payload - not a dict")
-            return web.Response(status=400, text="Invalid payload")
+        data = json_loads(await request.read())
+    except ValueError:
+        _LOGGER.error("voipms_sms: Invalid webhook payload - not valid JSON")
+        return web.Response(status=400, text="Invalid payload")
 
-        inner_data = data.get("data", {})
-        event_type = inner_data.get("event_type")
-        record_type = inner_data.get("record_type")
-        payload = inner_data.get("payload", {})
-        payload_record_type = payload.get("record_type")
+    # Don't log full webhook data as it may contain sensitive information
+    if _LOGGER.isEnabledFor(logging.DEBUG):
+        _LOGGER.debug("voipms_sms: Received webhook request")
 
-        # Validate expected event/record types
+    # Validate the payload structure
+    if not isinstance(data, dict):
+        _LOGGER.error("voipms_sms: Invalid webhook payload - not a dict")
+        return web.Response(status=400, text="Invalid payload")
+
+    # The nested containers come straight off the wire too, so type-check
+    # them like the envelope instead of assuming dicts
+    inner_data = data.get("data") or _EMPTY
+    if not isinstance(inner_data, dict):
+        _LOGGER.error("voipms_sms: Invalid webhook payload - data is not a dict")
+        return web.Response(status=400, text="Invalid payload")
+
+    payload = inner_data.get("payload") or _EMPTY
+    if not isinstance(payload, dict):
+        _LOGGER.error("voipms_sms: Invalid webhook payload - payload is not a dict")
+        return web.Response(status=400, text="Invalid payload")
+
+    event_type = inner_data.get("event_type")
+    record_type = inner_data.get("record_type")
+    payload_record_type = payload.get("record_type")
+
+    # Validate expected event/record types with one combined check on
+    # the happy path; only the rare failure branch works out which
+    # field was wrong to build the error message.
+    if (event_type, record_type, payload_record_type) != _VALID_TYPES:
         if event_type != "message.received":
             error_msg = f"Unknown event_type received: {event_type}"
-            _LOGGER.warning("voipms_sms: %s", error_msg)
-            await _send_notification(hass, "VoIP.ms SMS Error", error_msg)
-            return web.Response(status=400, text=error_msg)
-
-        if record_type != "event":
+        elif record_type != "event":
             error_msg = f"Unknown record_type received: {record_type}"
-            _LOGGER.warning("voipms_sms: %s", error_msg)
-            await _send_notification(hass, "VoIP.ms SMS Error", error_msg)
-            return web.Response(status=400, text=error_msg)
-
-        if payload_record_type != "message":
+        else:
             error_msg = f"Unknown payload record_type received: {payload_record_type}"
-            _LOGGER.warning("voipms_sms: %s", error_msg)
-            await _send_notification(hass, "VoIP.ms SMS Error", error_msg)
-            return web.Response(status=400, text=error_msg)
-
-        # Extract the "to" phone number to find the right sensor
-        to_numbers = payload.get("to", [])
-        if not to_numbers:
-            error_msg = "No destination phone number in payload"
-            _LOGGER.error("voipms_sms: %s", error_msg)
-            return web.Response(status=400, text=error_msg)
-
-        # Find matching sensor and update it
-        sensors = hass.data.get("voipms_sms_sensors", {})
-        updated = False
-        
-        for to_entry in to_numbers:
-            phone = to_entry.get("phone_number", "").lstrip("+").lstrip("1")
-            # Try to match with or without country code
-            for stored_phone, sensor in sensors.items():
-                stored_clean = stored_phone.lstrip("+").lstrip("1")
-                if phone == stored_clean or phone.endswith(stored_clean) or stored_clean.endswith(phone):
-                    sensor.update_from_webhook(data)
-                    updated = True
-                    break
-
-        if not updated:
-            _LOGGER.warning(
-                "voipms_sms: No sensor found for phone numbers: %s",
-                [t.get("phone_number") for t in to_numbers]
-            )
-
-        return web.Response(status=200, text="OK")
-
-    except Exception as e:
-        error_msg = f"Error processing webhook: {str(e)}"
+        _LOGGER.warning("voipms_sms: %s", error_msg)
+        _send_notification(hass, "VoIP.ms SMS Error", error_msg)
+        return web.Response(status=400, text=error_msg)
+
+    # Extract the "to" phone number to find the right sensor
+    to_numbers = payload.get("to", [])
+    if not to_numbers:
+        error_msg = "No destination phone number in payload"
         _LOGGER.error("voipms_sms: %s", error_msg)
-        await _send_notification(hass, "VoIP.ms SMS Error", error_msg)
-        return web.Response(status=500, text=error_msg)
+        return web.Response(status=400, text=error_msg)
+
+    # Find matching sensor and update it. Sensors are registered under
+    # their normalized last-10-digits form, so matching with or without
+    # country code collapses to one dict lookup per destination number.
+    sensors_by_last10 = hass.data.get("voipms_sms_sensors_by_e164", _EMPTY)
+    updated = False
+
+    for to_entry in to_numbers:
+        if not isinstance(to_entry, dict):
+            _LOGGER.error("voipms_sms: Invalid webhook payload - malformed to entry")
+            return web.Response(status=400, text="Invalid payload")
+        sensor = sensors_by_last10.get(_last10(to_entry.get("phone_number", "")))
+        if sensor is not None:
+            sensor.update_from_webhook(payload)
+            updated = True
+
+    if not updated:
+        _LOGGER.warning(
+            "voipms_sms: No sensor found for phone numbers: %s",
+            [t.get("phone_number") for t in to_numbers]
+        )
+
+    return web.Response(status=200, text="OK")
+
 
+def _send_notification(hass: HomeAssistant, title: str, message: str) -> None:
+    """Send a persistent notification.
 
-async def _send_notification(hass: HomeAssistant, title: str, message: str) -> None:
-    """Send a persistent notification."""
+    persistent_notification.async_create is itself synchronous, so a plain
+    call avoids allocating a coroutine per error just to await it.
+    """
     persistent_notification.async_create(
         hass,
         message,
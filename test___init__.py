@@ -1,12 +1,18 @@
+import base64
+
+import aiohttp
 import pytest
 from unittest.mock import AsyncMock, MagicMock, Mock, patch
 from homeassistant.core import HomeAssistant, ServiceCall
-from custom_components.voipms_sms import async_setup, send_sms, send_mms
+from custom_components.voipms_sms import async_setup, send_sms, send_mms, _b64_stream
 import contextlib
 
 @pytest.fixture
 def hass():
     hass_mock = MagicMock(spec=HomeAssistant)
+    # data and config are instance attributes, so spec=HomeAssistant hides them
+    hass_mock.data = {}
+    hass_mock.config = MagicMock()
     hass_mock.services = MagicMock()
     hass_mock.services.async_register = MagicMock()
     return hass_mock
@@ -32,7 +38,12 @@ def service_call_sms(hass):
 
 @pytest.fixture
 def service_call_mms(hass, tmp_path):
-    image_path = tmp_path / "test_image.jpg"
+    # Image paths must resolve inside the www (or media) directories
+    hass.config.path = Mock(side_effect=lambda *parts: str(tmp_path.joinpath(*parts)))
+    hass.config.media_dirs = {}
+    www_dir = tmp_path / "www"
+    www_dir.mkdir()
+    image_path = www_dir / "test_image.jpg"
     image_path.write_text("fake_image_data")
     return ServiceCall(
         hass=hass,
@@ -99,13 +110,20 @@ async def test_send_mms_success(hass, config, service_call_mms):
         mock_session_instance.__aenter__.return_value = mock_session_instance
         mock_session_instance.post.return_value = contextlib.nullcontext(mock_response)
 
-        with patch("custom_components.voipms_sms.get_base64_data", new_callable=AsyncMock) as mock_base64:
-            mock_base64.return_value = "base64_image_data"
-            await send_mms(hass, "test_user", "test_password", "1234567890", service_call_mms)
+        await send_mms(hass, "test_user", "test_password", "1234567890", service_call_mms)
+
+        mock_session_instance.post.assert_called_once()
+        # The media is posted as multipart form data
+        form = mock_session_instance.post.call_args.kwargs["data"]
+        assert isinstance(form, aiohttp.FormData)
+        # Ensure the mocked response text is awaited
+        await mock_response.text()
 
-            mock_session_instance.post.assert_called_once()
-            # Ensure the mocked response text is awaited
-            await mock_response.text()
+    # The streamed media part encodes the image as a base64 data URI
+    image_path = service_call_mms.data["image_path"]
+    chunks = [chunk async for chunk in _b64_stream(image_path, "image/jpeg")]
+    expected = b"data:image/jpeg;base64," + base64.b64encode(b"fake_image_data")
+    assert b"".join(chunks) == expected
 
 @pytest.mark.asyncio
 async def test_send_mms_missing_image(hass, config, service_call_mms):